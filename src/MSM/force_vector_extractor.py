@@ -2,35 +2,50 @@
 
 # Imports ---------------------------------------------------------------------
 import os
-import math
+import multiprocessing
 import numpy as np
-import pandas as pd
 import opensim as osim
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+# Each worker loads and initialises its own model, only worth it for this many rows
+MIN_ROWS_PER_JOB = 100
 
 
 # Defs ------------------------------------------------------------------------
-def extract_force_vectors(osim_path, sto_path, boi, output_path):
+def extract_force_vector_range(osim_path, sto_path, boi, time_indices):
+    """
+    Extract boi force origins and directions for a range of .sto time indices.
+    Each call loads its own model and state, so ranges can run in parallel.
+    """
     # Load input
     model = osim.Model(osim_path)
     sto_data = osim.TimeSeriesTable(sto_path)
 
-    # Initiate output
+    # Initiate output, one (steps, ends, xyz) array per muscle
+    num_steps = len(time_indices)
     force_origins = {}
-    force_directions = {"time": []}
-
-    muscles = model.getMuscles()
+    force_directions = {"time": np.empty(num_steps)}
 
-    for muscle in muscles:
+    # Path point ends (first / last) of each muscle attached to the boi
+    boi_ends = {}
+    for muscle in model.getMuscles():
         path_points = muscle.getGeometryPath().getPathPointSet()
-        for i in range(path_points.getSize()):
-            point = path_points.get(i)
-            if point.getBodyName() in boi:
-                if i == 0 or i == path_points.getSize() - 1:
-                    force_origins[muscle.getName()] = []
-                    force_directions[muscle.getName()] = []
-                else:
-                    continue
+        ends = [
+            i
+            for i in (0, path_points.getSize() - 1)
+            if path_points.get(i).getBodyName() in boi
+        ]
+        if ends:
+            boi_ends[muscle.getName()] = ends
+            force_origins[muscle.getName()] = np.empty((num_steps, len(ends), 3))
+            force_directions[muscle.getName()] = np.empty((num_steps, len(ends), 3))
+    muscles = [
+        muscle for muscle in model.getMuscles() if muscle.getName() in boi_ends
+    ]
 
     # Initiate model state
     state = model.initSystem()
@@ -44,100 +59,136 @@ def extract_force_vectors(osim_path, sto_path, boi, output_path):
             if coord_name in model_coordinates:
                 sto_to_coord_map[label] = coord_name
 
-    # Iterate through time steps in the .sto file
-    for time_index in range(sto_data.getNumRows()):
-        time = sto_data.getIndependentColumn()[time_index]
-        force_directions["time"].append(time)
+    # Resolve coordinates, state columns and force direction arrays once
+    coords = {
+        label: model.updCoordinateSet().get(coord_name)
+        for label, coord_name in sto_to_coord_map.items()
+    }
+    columns = {
+        label: sto_data.getDependentColumn(label).to_numpy()
+        for label in sto_to_coord_map
+    }
+    times = sto_data.getIndependentColumn()
+    muscle_force_directions = {
+        muscle.getName(): osim.ArrayPointForceDirection() for muscle in muscles
+    }
+
+    # Iterate through the time steps of this range
+    for step, time_index in enumerate(time_indices):
+        force_directions["time"][step] = times[time_index]
 
         # Update model states
-        for sto_label, coord_name in sto_to_coord_map.items():
-            value = sto_data.getDependentColumn(sto_label)[time_index]
-            coord = model.updCoordinateSet().get(coord_name)
-            coord.setValue(state, value)
+        for sto_label, coord in coords.items():
+            coord.setValue(state, columns[sto_label][time_index])
         model.realizeDynamics(state)
 
         # Extract muscle path points in current state
         for muscle in muscles:
-            point_force_directions = osim.ArrayPointForceDirection()
+            point_force_directions = muscle_force_directions[muscle.getName()]
+            point_force_directions.clearAndDestroy()
             geom_path = muscle.getGeometryPath()
             geom_path.updateGeometry(state)
             geom_path.getPointForceDirections(state, point_force_directions)
 
-            path_points = geom_path.getPathPointSet()
-            for i in range(path_points.getSize()):
-                point = path_points.get(i)
-                if point.getBodyName() in boi:
-                    if i == 0:
-                        insertion_index = 0
-                        other_index = 1
-                    elif i == path_points.getSize() - 1:
-                        insertion_index = point_force_directions.getSize() - 1
-                        other_index = insertion_index - 1
-                    else:
-                        continue
-
-                    pfd = point_force_directions.get(insertion_index)
-                    pfd2 = point_force_directions.get(other_index)
-
-                    insertion_in_ground = [
-                        pfd.frame().findStationLocationInGround(state, pfd.point())[0],
-                        pfd.frame().findStationLocationInGround(state, pfd.point())[1],
-                        pfd.frame().findStationLocationInGround(state, pfd.point())[2],
-                    ]
-
-                    previous_in_ground = [
-                        pfd2.frame().findStationLocationInGround(state, pfd2.point())[
-                            0
-                        ],
-                        pfd2.frame().findStationLocationInGround(state, pfd2.point())[
-                            1
-                        ],
-                        pfd2.frame().findStationLocationInGround(state, pfd2.point())[
-                            2
-                        ],
-                    ]
-
-                    insertion_vector = [
-                        v1 - v2
-                        for v1, v2 in zip(previous_in_ground, insertion_in_ground)
-                    ]
-                    normalized_vector = insertion_vector / np.linalg.norm(
-                        insertion_vector
-                    )
-                    normalized_vector = osim.Vec3(normalized_vector)
-                    transform = model.getGround().findTransformBetween(
-                        state, pfd.frame()
-                    )
-                    rotated_vector = transform.R().multiply(normalized_vector)
-
-                    force_origins[muscle.getName()].append(
-                        [
-                            pfd.point()[0],
-                            pfd.point()[1],
-                            pfd.point()[2],
-                        ]
-                    )
-                    force_directions[muscle.getName()].append(
-                        [
-                            math.degrees(rotated_vector[0]),
-                            math.degrees(rotated_vector[1]),
-                            math.degrees(rotated_vector[2]),
-                        ]
-                    )
+            for end, i in enumerate(boi_ends[muscle.getName()]):
+                if i == 0:
+                    insertion_index = 0
+                    other_index = 1
+                else:
+                    insertion_index = point_force_directions.getSize() - 1
+                    other_index = insertion_index - 1
+
+                pfd = point_force_directions.get(insertion_index)
+                pfd2 = point_force_directions.get(other_index)
+
+                p_ins = pfd.frame().findStationLocationInGround(state, pfd.point())
+                p_prev = pfd2.frame().findStationLocationInGround(state, pfd2.point())
+                insertion_in_ground = np.array([p_ins[0], p_ins[1], p_ins[2]])
+                previous_in_ground = np.array([p_prev[0], p_prev[1], p_prev[2]])
+
+                insertion_vector = previous_in_ground - insertion_in_ground
+                normalized_vector = insertion_vector / np.linalg.norm(insertion_vector)
+                normalized_vector = osim.Vec3(normalized_vector)
+                transform = model.getGround().findTransformBetween(
+                    state, pfd.frame()
+                )
+                rotated_vector = transform.R().multiply(normalized_vector)
+
+                force_origins[muscle.getName()][step, end] = [
+                    pfd.point()[0],
+                    pfd.point()[1],
+                    pfd.point()[2],
+                ]
+                force_directions[muscle.getName()][step, end] = [
+                    rotated_vector[0],
+                    rotated_vector[1],
+                    rotated_vector[2],
+                ]
+
+    return force_origins, force_directions
+
+
+def write_vector_table(vectors, path):
+    """
+    Write {name: array} to a zstd compressed Parquet file, (steps, ends, xyz)
+    arrays as list<float32> columns of one xyz row per step and end.
+    """
+    columns = {}
+    for name, values in vectors.items():
+        if values.ndim == 1:
+            columns[name] = pa.array(values)
+        else:
+            columns[name] = pa.FixedSizeListArray.from_arrays(
+                pa.array(values.astype(np.float32).ravel()), 3
+            )
+    pq.write_table(pa.table(columns), path, compression="zstd")
+
+
+def extract_force_vectors(osim_path, sto_path, boi, output_path):
+    # Timesteps are independent, split them in contiguous ranges over processes
+    num_rows = osim.TimeSeriesTable(sto_path).getNumRows()
+    num_jobs = max(1, min(os.cpu_count() or 1, num_rows // MIN_ROWS_PER_JOB))
+
+    if num_jobs == 1:
+        # Short tables do not pay back the per process model setup
+        force_origins, force_directions = extract_force_vector_range(
+            osim_path, sto_path, boi, range(num_rows)
+        )
+    else:
+        time_ranges = np.array_split(np.arange(num_rows), num_jobs)
+        # Spawned workers, forking the threaded Streamlit server is unsafe
+        with ProcessPoolExecutor(
+            max_workers=num_jobs, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            results = list(
+                pool.map(
+                    extract_force_vector_range,
+                    repeat(osim_path),
+                    repeat(sto_path),
+                    repeat(boi),
+                    time_ranges,
+                )
+            )
+
+        # Ranges are returned in order, so concatenation keeps the time order
+        force_origins = {
+            name: np.concatenate([origins[name] for origins, _ in results])
+            for name in results[0][0]
+        }
+        force_directions = {
+            name: np.concatenate([directions[name] for _, directions in results])
+            for name in results[0][1]
+        }
 
     force_origin_paths = os.path.join(
-        output_path, f"{Path(sto_path).stem}_{boi}_muscle_origins.json"
+        output_path, f"{Path(sto_path).stem}_{boi}_muscle_origins.parquet"
     )
     force_vector_paths = os.path.join(
-        output_path, f"{Path(sto_path).stem}_{boi}_muscle_vectors.json"
+        output_path, f"{Path(sto_path).stem}_{boi}_muscle_vectors.parquet"
     )
 
-    pd.DataFrame(force_origins).to_json(
-        force_origin_paths, orient="records", lines=True
-    )
-    pd.DataFrame(force_directions).to_json(
-        force_vector_paths, orient="records", lines=True
-    )
+    write_vector_table(force_origins, force_origin_paths)
+    write_vector_table(force_directions, force_vector_paths)
 
     return force_origin_paths, force_vector_paths
 
@@ -149,24 +200,14 @@ def extract_model_bone_and_muscle(model_path):
     body_to_muscles = {}
 
     # Iterate through all muscles in the model
-    for i in range(model.getMuscles().getSize()):
-        muscle = model.getMuscles().get(i)
+    for muscle in model.getMuscles():
         muscle_name = muscle.getName()
-        
-        # Get the origin and insertion body names
-        origin_body = muscle.getGeometryPath().getPathPointSet().get(0).getBodyName()
-        insertion_body = muscle.getGeometryPath().getPathPointSet().get(
-            muscle.getGeometryPath().getPathPointSet().getSize() - 1
-        ).getBodyName()
-
-        # Add the muscle to the origin body
-        if origin_body not in body_to_muscles:
-            body_to_muscles[origin_body] = []
-        body_to_muscles[origin_body].append(muscle_name)
-
-        # Add the muscle to the insertion body
-        if insertion_body not in body_to_muscles:
-            body_to_muscles[insertion_body] = []
-        body_to_muscles[insertion_body].append(muscle_name)
+        path_points = muscle.getGeometryPath().getPathPointSet()
+
+        # Add the muscle to its origin and insertion body
+        origin_body = path_points.get(0).getBodyName()
+        insertion_body = path_points.get(path_points.getSize() - 1).getBodyName()
+        body_to_muscles.setdefault(origin_body, []).append(muscle_name)
+        body_to_muscles.setdefault(insertion_body, []).append(muscle_name)
 
     return body_to_muscles
@@ -7,6 +7,32 @@ import matplotlib.pyplot as plt
 from src.MSM.sto_generator import read_input
 
 
+def read_force_table(path):
+    # Force vectors are written as .parquet, older output as JSON lines
+    if os.path.splitext(path)[1] == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_json(path, orient="records", lines=True)
+
+
+def arrow_matrix(origin, direction, scale):
+    """
+    4x4 transform placing a unit +x `pv.Arrow()` at `origin`, pointing along
+    `direction` and scaled by `scale`
+    """
+    x = np.asarray(direction, dtype=float)
+    x = x / np.linalg.norm(x)
+    # Any axis not parallel to the direction completes the orthonormal frame
+    helper = [0.0, 0.0, 1.0] if abs(x[2]) < 0.9 else [0.0, 1.0, 0.0]
+    y = np.cross(helper, x)
+    y /= np.linalg.norm(y)
+    z = np.cross(x, y)
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = np.column_stack([x, y, z]) * scale
+    matrix[:3, 3] = origin
+    return matrix
+
+
 def generate_vector_gif(
     mesh_path,
     muscle_force_path,
@@ -17,8 +43,8 @@ def generate_vector_gif(
     mesh = pv.read(os.path.join(mesh_path))
     df, _ = read_input(muscle_force_path)
 
-    force_origins = pd.read_json(force_origins_path, orient="records", lines=True)
-    force_vectors = pd.read_json(force_vectors_path, orient="records", lines=True)
+    force_origins = read_force_table(force_origins_path)
+    force_vectors = read_force_table(force_vectors_path)
 
     pl = pv.Plotter(off_screen=False)
     pl.view_xy()
@@ -43,13 +69,10 @@ def generate_vector_gif(
             point_size=20,
             render_points_as_spheres=True,
         )
-        force_vector_actor[muscle] = pl.add_mesh(
-            pv.Arrow(
-                start=force_origins[muscle][0],
-                direction=force_vectors[muscle][0],
-                scale=0.1,
-            ),
-            color=rgb_color,
+        # Unit arrow along +x, placed and oriented per frame through its matrix
+        force_vector_actor[muscle] = pl.add_mesh(pv.Arrow(), color=rgb_color)
+        force_vector_actor[muscle].user_matrix = arrow_matrix(
+            force_origins[muscle][0], force_vectors[muscle][0], 0.1
         )
         legend.append([muscle, rgb_color])
     pl.add_legend(legend)
@@ -63,15 +86,16 @@ def generate_vector_gif(
             pl.remove_actor(text)
             text = pl.add_text(f"Step: {step}, time={time:.2f}", color="white")
             for muscle in muscle_names:
-                force_vector_actor[muscle].scale = (
+                # Force vectors are unit directions, not Euler angles
+                force_vector_actor[muscle].user_matrix = arrow_matrix(
+                    force_origins[muscle][step],
+                    force_vectors[muscle][step],
                     df[
                         # f"/forceset/{muscle}/normalized_tendon_force"
                         f"/forceset/{muscle}|active_fiber_force"
                     ][step]
-                    * scale_factor
+                    * scale_factor,
                 )
-                force_vector_actor[muscle].position = force_origins[muscle][step]
-                force_vector_actor[muscle].orientation = force_vectors[muscle][step]
             pl.write_frame()
     pl.close()
 
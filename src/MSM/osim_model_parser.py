@@ -89,8 +89,7 @@ def parse_model_for_states(osim):
 
     # Force activation / normalized tendon force
     force_set = root.findall("Model/ForceSet/objects/")
-    forces = [force for force in force_set]
-    for force in forces:
+    for force in force_set:
         if "DeGroote" in force.tag:
             states.append(f"/forceset/{force.attrib.get('name')}/activation")
             states.append(
@@ -99,8 +98,7 @@ def parse_model_for_states(osim):
 
     # Force
     force_set = root.findall("Model/ForceSet/objects/")
-    forces = [force for force in force_set]
-    for force in forces:
+    for force in force_set:
         if "DeGroote" in force.tag:
             states.append(f"/forceset/{force.attrib.get('name')}")
 
@@ -117,8 +115,7 @@ def parse_model_for_states(osim):
 
     # Force implicitderiv_normalized_tendon_force
     force_set = root.findall("Model/ForceSet/objects/")
-    forces = [force for force in force_set]
-    for force in forces:
+    for force in force_set:
         if "DeGroote" in force.tag:
             states.append(
                 f"/forceset/{force.attrib.get('name')}/implicitderiv_normalized_tendon_force"
@@ -135,8 +132,7 @@ def parse_model_for_joints(osim):
 
     joint_set = root.findall("Model/JointSet/objects/")
     # joints = [joint for joint in joint_set if joint.tag != "WeldJoint"]
-    joints = [joint for joint in joint_set]
-    for joint in joints:
+    for joint in joint_set:
         joint_name = joint.attrib.get("name")
         if not joint_name:
             continue
@@ -1,19 +1,10 @@
 # Imports ---------------------------------------------------------------------
 import os
 import shutil
-from numpy import half
-import pandas as pd
-import pyvista as pv
 import streamlit as st
 from pathlib import Path
 
-from src.MSM.sto_generator import generate_sto, read_input, write_columns
-from src.MSM.moco_track_kinematics import moco_track_states
-from src.MSM.force_vector_extractor import (
-    extract_force_vectors,
-    extract_model_bone_and_muscle,
-)
-from src.app.app_visuals import click_visual_toi_selector
+from src.app.app_io import read_sto
 from src.app.app_FE_calls import (
     call_surface_remesher,
     call_qa_highres_surface,
@@ -33,6 +24,8 @@ sts = st.session_state
 
 # Defs ------------------------------------------------------------------------
 def generate_kinematics(osim_path, kine_path, output_path):
+    from src.MSM.sto_generator import generate_sto
+
     kinematics_path = generate_sto(
         Path(kine_path),
         model_file=Path(osim_path),
@@ -52,6 +45,8 @@ def track_kinematics(moco_path, osim_path, output_path):
 
 
 def run_moco(moco_path, osim_path, output_path):
+    from src.MSM.moco_track_kinematics import moco_track_states
+
     try:
         os.chdir(output_path)
         filter_params = {
@@ -78,7 +73,9 @@ def run_moco(moco_path, osim_path, output_path):
 def calculate_total_muscle_force(
     dynamics_path,
 ):
-    df, _ = read_input(dynamics_path)
+    import pandas as pd
+
+    df, _ = read_sto(dynamics_path)
 
     muscles = list(
         set(
@@ -102,13 +99,28 @@ def calculate_total_muscle_force(
 
 
 def bone_muscle_extraction(model):
-    bone_muscle_map = extract_model_bone_and_muscle(model)
+    stat = os.stat(model)
+    bone_muscle_map = cached_bone_muscle_extraction(
+        model,
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
 
     return bone_muscle_map
 
 
+@st.cache_data(show_spinner=False)
+def cached_bone_muscle_extraction(model, mtime_ns, size):
+    # mtime and size only key the cache, so a newly uploaded model is reparsed
+    from src.MSM.force_vector_extractor import extract_model_bone_and_muscle
+
+    return extract_model_bone_and_muscle(model)
+
+
 def force_vector_extraction(model, sto_data, boi, output_path):
     if st.button(f"Extract {boi} force vectors"):
+        from src.MSM.force_vector_extractor import extract_force_vectors
+
         with st.spinner("Extracting vectors..."):
             try:
                 (
@@ -122,7 +134,10 @@ def force_vector_extraction(model, sto_data, boi, output_path):
 
 
 def toi_selector(sto, muscles):
-    df, _ = read_input(sto)
+    import pandas as pd
+    from src.app.app_visuals import click_visual_toi_selector
+
+    df, _ = read_sto(sto)
     df2 = pd.DataFrame(0, index=range(len(df["time"])), columns=["time"])
     df2["time"] = df["time"]
     for col in df.columns:
@@ -274,7 +289,14 @@ def manual_BC_selector(
 def generate_design_domain(
     mesh_path,
 ):
-    sts.design_path = os.path.splitext(mesh_path)[0] + "_design_domain.json"
+    sts.design_path = os.path.splitext(mesh_path)[0] + "_design_domain.npz"
+    # The design domain only depends on the mesh surface, reuse it until the mesh
+    # is rewritten instead of reading the mesh and extracting its surface again
+    if (
+        os.path.isfile(sts.design_path)
+        and os.stat(sts.design_path).st_mtime_ns >= os.stat(mesh_path).st_mtime_ns
+    ):
+        return
     result = call_design_domain_generator(mesh_path, sts.design_path)
     if result.returncode:
         st.error("Failed to generated design domain")
@@ -361,6 +383,8 @@ def setup_visualize_opencmiss(
     clip="y",
     thresh="Structure",
 ):
+    import pyvista as pv
+
     mesh = pv.read(combined_opencmiss_solution_path)
     scalars = list(mesh.cell_data.keys())
     metric = st.radio(
@@ -444,27 +468,28 @@ def clear_session_state(item=None):
 
 
 def clear_output(file_type="all", file_name=None):
-    for file in os.listdir(sts.output_path):
-        file_path = os.path.join(sts.output_path, file)
+    with os.scandir(sts.output_path) as it:
+        entries = list(it)
+    for entry in entries:
         if file_type == "all" or file_type == "files":
-            if os.path.isfile(file_path):
+            if entry.is_file():
                 try:
-                    os.unlink(file_path)
-                    clear_session_state(file_path)
+                    os.unlink(entry.path)
+                    clear_session_state(entry.path)
                 except Exception as e:
                     print(f"Error while removing file: {e}")
         elif file_type == "file" and file_name is not None:
-            if os.path.isfile(file_path) and file == file_name:
+            if entry.name == file_name and entry.is_file():
                 try:
-                    os.unlink(file_path)
-                    clear_session_state(file_path)
+                    os.unlink(entry.path)
+                    clear_session_state(entry.path)
                 except Exception as e:
                     print(f"Error while removing file: {e}")
         elif file_type == "all" or file_type == "dirs":
-            if os.path.isdir(file_path):
+            if entry.is_dir():
                 try:
-                    shutil.rmtree(file_path)
-                    clear_session_state(file_path)
+                    shutil.rmtree(entry.path)
+                    clear_session_state(entry.path)
                 except Exception as e:
                     print(f"Error while removing directory: {e}")
     st.rerun()
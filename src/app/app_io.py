@@ -5,8 +5,9 @@ import os
 import io
 import zipfile
 import streamlit as st
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
 
-from src.MSM.sto_generator import read_mat_to_df
 sts = st.session_state
 
 
@@ -104,6 +105,23 @@ def find_file_in_dir(directory, string):
                     return os.path.join(directory, file)
 
 
+def path_checker():
+    """
+    Return an existence check that stats each path at most once, used to avoid
+    repeated os.path.exists calls on the same paths within a single rerun.
+    """
+    exists = {}
+
+    def check(path):
+        if path is None:
+            return False
+        if path not in exists:
+            exists[path] = os.path.exists(path)
+        return exists[path]
+
+    return check
+
+
 def write_to_output(file, output_dir, tag):
     tag = None if file.name[0: len(tag)] == tag else tag
     file_name = f"{tag}_{file.name}" if tag else file.name
@@ -132,7 +150,7 @@ def project_uploader():
     output_path = st.file_uploader(
         "Drag and drop OR select all previous output files here",
         accept_multiple_files=True,
-        type=[".osim", ".sto", ".json", ".gif", ".mat"],
+        type=[".osim", ".sto", ".json", ".parquet", ".npz", ".gif", ".mat"],
     )
     if output_path is not None:
         if os.path.exists(sts.output_path):
@@ -177,10 +195,143 @@ def kine_uploader():
 
     if sts.kine_path is not None and os.path.exists(sts.kine_path):
         with st.expander("Show .mat keyvalues", expanded=False):
+            from src.MSM.sto_generator import read_mat_to_df
+
             df = read_mat_to_df(sts.kine_path)
             st.write([col[:-3] for col in df if col.endswith("Ang")])
 
 
+def read_sto(input_file):
+    stat = os.stat(input_file)
+    return cached_read_sto(str(input_file), stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_data(show_spinner=False)
+def cached_read_sto(input_file, mtime_ns, size):
+    # mtime and size only key the cache, so rewritten .sto files are parsed again
+    from src.MSM.sto_generator import read_input
+
+    return read_input(input_file)
+
+
+def read_table(input_file):
+    stat = os.stat(input_file)
+    return cached_read_table(str(input_file), stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_data(show_spinner=False)
+def cached_read_table(input_file, mtime_ns, size):
+    # mtime and size only key the cache, so rewritten tables are parsed again
+    import pandas as pd
+
+    # Force vectors are written as .parquet, older output as JSON lines
+    if os.path.splitext(input_file)[1] == ".parquet":
+        return pd.read_parquet(input_file)
+    return pd.read_json(input_file, orient="records", lines=True)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def read_file_bytes(file_path, mtime_ns, size):
+    # mtime and size only key the cache, so changed files are read again
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+@st.cache_data(show_spinner=False)
+def geometry_index(geom_path, mtime_ns):
+    # mtime only keys the cache, so uploading new geometry rebuilds the index
+    with os.scandir(geom_path) as it:
+        return {
+            entry.name: entry.path
+            for entry in sorted(it, key=lambda e: e.name)
+            if entry.is_file()
+        }
+
+
+# Output files of the bone of interest, matched by suffix first and tag second.
+# Tuples are in order of precedence, i.e. extracted meshes override volumetric ones
+# and .parquet force vectors override JSON ones. Suffixes override tags, so .npz
+# design domains override JSON ones.
+BOI_FILE_SUFFIXES = (
+    (".gif", "gif_path"),
+    ("origins.json", "force_origins_path"),
+    ("vectors.json", "force_vectors_path"),
+    ("origins.parquet", "force_origins_path"),
+    ("vectors.parquet", "force_vectors_path"),
+    ("volumetric.mesh", "vol_path"),
+    ("extracted.mesh", "vol_path"),
+    ("design_domain.npz", "design_path"),
+    # BCs only by their JSON lines suffix, debug .txt node lists share the tags
+    ("dirichlet_BC.json", "dirichlet_path"),
+    ("neumann_BC.json", "neumann_path"),
+)
+BOI_FILE_TAGS = (
+    ("design", "design_path"),
+)
+BOI_SUFFIXES = tuple(suffix for suffix, _ in BOI_FILE_SUFFIXES)
+
+
+def scan_boi_dir(path, boi):
+    """Return the subdirectories and the first boi file per key of one directory."""
+    subdirs, matches = [], {}
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+                continue
+            name = entry.name
+            if boi not in name:
+                continue
+            if name.endswith(BOI_SUFFIXES):
+                key = next(k for k, _ in BOI_FILE_SUFFIXES if name.endswith(k))
+            else:
+                key = next((k for k, _ in BOI_FILE_TAGS if k in name), None)
+            if key:
+                matches.setdefault(key, entry.path)
+
+    return subdirs, matches
+
+
+def output_dir_mtime(output_path):
+    """
+    Latest mtime_ns of `output_path` and its direct subfolders. The app writes its
+    output into the output folder or one level below it, so new or removed output
+    changes this key, from a single scandir of the output folder.
+    """
+    latest = os.stat(output_path).st_mtime_ns
+    with os.scandir(output_path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                latest = max(latest, entry.stat(follow_symlinks=False).st_mtime_ns)
+
+    return latest
+
+
+@st.cache_data(show_spinner=False, persist="disk")
+def boi_output_files(output_path, boi, mtime_ns):
+    """
+    Map session state attributes to existing output files of the bone of interest.
+    `mtime_ns` only keys the cache, pass `output_dir_mtime(output_path)` so new
+    output in the folder or its subfolders invalidates it.
+    Results persist on disk, so app restarts reuse previous scans.
+    """
+    boi_files = {}
+    level = [output_path]
+    # Directories of one tree level are scanned concurrently, scandir is I/O bound
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as pool:
+        while level:
+            next_level = []
+            for subdirs, matches in pool.map(scan_boi_dir, level, repeat(boi)):
+                next_level.extend(subdirs)
+                # Keys are applied in order of precedence, deeper levels override
+                for key, attr in BOI_FILE_TAGS + BOI_FILE_SUFFIXES:
+                    if key in matches:
+                        boi_files[attr] = matches[key]
+            level = next_level
+
+    return boi_files
+
+
 def zip_directory(folder_path):
     """Compress an entire directory into a ZIP file in memory."""
     buffer = io.BytesIO()  # Create a buffer to hold the ZIP file
@@ -195,20 +346,22 @@ def zip_directory(folder_path):
     return buffer.getvalue()
 
 
-def dir_downloader(dir, dir_name, show_files=False, download_name="dir"):
+def dir_downloader(dir, dir_name, show_files=False, download_name="dir", prepare=True):
     if os.path.exists(dir):
         download = (
             os.path.splitext(os.path.basename(sts.osim_path))[0]
             if download_name == "model"
             else dir_name
         )
-        st.download_button(
-            label=f"Download {dir_name}.zip",
-            data=zip_directory(dir),
-            file_name=f"{download}.zip",
-            mime="application/zip",
-        )
+        # Zipping reads the whole directory, only do so when downloads are prepared
+        if prepare:
+            st.download_button(
+                label=f"Download {dir_name}.zip",
+                data=zip_directory(dir),
+                file_name=f"{download}.zip",
+                mime="application/zip",
+            )
         if show_files:
-            st.write([file for file in os.listdir(dir)])
+            st.write(os.listdir(dir))
     else:
         st.error("The specified folder does not exist. Please check the path.")
@@ -7,6 +7,11 @@ from src.app.app_io import (
     kine_uploader,
     geom_uploader,
     dir_downloader,
+    read_file_bytes,
+    path_checker,
+    geometry_index,
+    boi_output_files,
+    output_dir_mtime,
 )
 from src.app.app_functions import (
     generate_kinematics,
@@ -26,12 +31,6 @@ from src.app.app_functions import (
     generate_volumetric_mesh,
     clear_output,
 )
-from src.app.app_visuals import (
-    visual_kinematics,
-    visual_dynamics,
-    visual_force_vector_gif,
-    visual_toi_boi_force_vectors,
-)
 
 sts = st.session_state
 
@@ -58,13 +57,9 @@ def page_home():
 
 def page_kinematics():
     st.title("Kinematics")
+    exists = path_checker()
 
-    if (
-        sts.osim_path is not None
-        and sts.kine_path is not None
-        and os.path.exists(sts.osim_path)
-        and os.path.exists(sts.kine_path)
-    ):
+    if exists(sts.osim_path) and exists(sts.kine_path):
         st.write(f"Model: {os.path.basename(sts.osim_path)}")
         if st.button("Generate kinematics"):
             generate_kinematics(
@@ -73,7 +68,7 @@ def page_kinematics():
                 sts.output_path,
             )
 
-        if sts.kinematics_path is not None and os.path.exists(sts.kinematics_path):
+        if exists(sts.kinematics_path):
             if st.button("Track kinematics"):
                 track_kinematics(
                     sts.app_path,
@@ -84,13 +79,9 @@ def page_kinematics():
     else:
         st.write("No files uploaded yet. Please upload under :rainbow[input]")
 
-    if (
-        sts.kinematics_path is not None
-        and os.path.exists(sts.kinematics_path)
-        and sts.moco_solution_path is not None
-        and os.path.exists(sts.moco_solution_path)
-    ):
+    if exists(sts.kinematics_path) and exists(sts.moco_solution_path):
         st.subheader("Results: validate output versus input")
+        from src.app.app_visuals import visual_kinematics
 
         group_kine = st.toggle("Group kinematics legend", value=True)
         visual_kinematics(
@@ -102,10 +93,10 @@ def page_kinematics():
 
 def page_dynamics():
     st.header("Dynamics")
+    exists = path_checker()
+    from src.app.app_visuals import visual_dynamics
 
-    if sts.moco_solution_dynamics_path is not None and os.path.exists(
-        sts.moco_solution_dynamics_path
-    ):
+    if exists(sts.moco_solution_dynamics_path):
         group_legend = st.toggle("Group dynamics legend", value=True)
         color_map = visual_dynamics(
             sts.moco_solution_dynamics_path,
@@ -117,7 +108,7 @@ def page_dynamics():
                 sts.moco_solution_dynamics_path,
             )
 
-    if sts.muscle_forces_path is not None and os.path.exists(sts.muscle_forces_path):
+    if exists(sts.muscle_forces_path):
         visual_dynamics(
             sts.muscle_forces_path,
             color_map=color_map,
@@ -131,43 +122,36 @@ def page_dynamics():
 
 def page_boi():
     st.header("Force vector extraction")
+    exists = path_checker()
 
-    if sts.osim_path is not None and os.path.exists(sts.osim_path):
+    if exists(sts.osim_path):
         st.write(f"Model selected: {os.path.basename(sts.osim_path)}")
 
         # Boi selector -----------------------------------------------------------
         sts.bones_muscle_map = bone_muscle_extraction(sts.osim_path)
-        bones = [bones for bones in sts.bones_muscle_map]
         boi = st.radio(
             "Bone of interest:",
-            [bone for bone in bones],
+            list(sts.bones_muscle_map),
             index=None,
         )
         if boi:
             sts.boi = boi
 
         if sts.boi:
-            file_mapping = {
-                ".gif": "gif_path",
-                "origins.json": "force_origins_path",
-                "vectors.json": "force_vectors_path",
-                "volumetric.mesh": "vol_path",
-                "extracted.mesh": "vol_path",
-                "dirichlet": "dirichlet_path",
-                "neumann": "neumann_path",
-                "design": "design_path",
-            }
-            for dirpath, _, files in os.walk(sts.output_path):
-                for key, attr in file_mapping.items():
-                    for file in files:
-                        if sts.boi in file:
-                            if key in file:
-                                setattr(sts, attr, os.path.join(dirpath, file))
-                                break
+            boi_files = boi_output_files(
+                sts.output_path,
+                sts.boi,
+                output_dir_mtime(sts.output_path),
+            )
+            for attr, path in boi_files.items():
+                setattr(sts, attr, path)
 
     else:
         st.write("No files uploaded yet. Please upload under :rainbow[input]")
 
+    # The boi is fixed for the remainder of this rerun
+    has_boi = sts.boi is not None
+
     if sts.osim_path is not None and sts.moco_solution_path is not None:
         force_vector_extraction(
             sts.osim_path,
@@ -181,31 +165,27 @@ def page_boi():
                 before extracting force vectors"
         )
 
-    if (
-        sts.boi is not None
-        and sts.geom_path is not None
-        and os.path.exists(sts.geom_path)
-    ):
-        for _, _, bones in os.walk(sts.geom_path):
-            for bone in bones:
-                if sts.boi in bone:
-                    sts.boi_path = os.path.join(
-                        sts.geom_path,
-                        bone,
-                    )
+    if has_boi and exists(sts.geom_path):
+        geometry = geometry_index(
+            sts.geom_path,
+            os.stat(sts.geom_path).st_mtime_ns,
+        )
+        for bone, bone_path in geometry.items():
+            if sts.boi in bone:
+                sts.boi_path = bone_path
 
     else:
         st.write("No geometry files uploaded yet. Please upload under :rainbow[Input]")
 
     if (
-        sts.force_origins_path is not None
-        and sts.force_vectors_path is not None
-        and os.path.exists(sts.force_origins_path)
-        and os.path.exists(sts.force_vectors_path)
+        exists(sts.force_origins_path)
+        and exists(sts.force_vectors_path)
         and sts.boi_path is not None
     ):
         # Generate gif ----------------------------------------------------
         if st.button(f"Generate {sts.boi} gif"):
+            from src.app.app_visuals import visual_force_vector_gif
+
             visual_force_vector_gif(
                 sts.boi_path,
                 sts.moco_solution_dynamics_path,
@@ -214,12 +194,7 @@ def page_boi():
                 sts.output_path,
             )
 
-    if (
-        sts.gif_path is not None
-        and os.path.exists(sts.gif_path)
-        and sts.boi is not None
-        and sts.boi in sts.gif_path
-    ):
+    if has_boi and exists(sts.gif_path) and sts.boi in sts.gif_path:
         st.image(
             sts.gif_path,
             caption="Force vector over time",
@@ -228,6 +203,7 @@ def page_boi():
 
 def page_meshing():
     st.title(f"Volumetric meshing")
+    exists = path_checker()
 
     select_mesh_toggle = st.toggle("Mesh OpenSim geometry", value=True)
 
@@ -252,11 +228,7 @@ def page_meshing():
                     st.error("Failed to generate mesh")
                     print(result.stderr)
 
-            if (
-                sts.vol_path is not None
-                and os.path.exists(sts.vol_path)
-                and sts.boi in sts.vol_path
-            ):
+            if exists(sts.vol_path) and sts.boi in sts.vol_path:
                 st.success(f"Volumetric {sts.boi} mesh generated")
 
         else:
@@ -265,48 +237,51 @@ def page_meshing():
         st.write("Upload custom geometry")
 
 
+@st.fragment
+def toi_fragment(muscles):
+    # Clicking a toi only reruns this fragment, not the whole BCs page
+    toi_selector(
+        sts.moco_solution_dynamics_path,
+        muscles,
+    )
+    st.write(f"Selected time: {sts.toi}")
+
+    if sts.toi:
+        from src.app.app_visuals import visual_toi_boi_force_vectors
+
+        with st.empty():
+            visual_toi_boi_force_vectors(
+                sts.boi_path,
+                sts.moco_solution_dynamics_path,
+                sts.force_origins_path,
+                sts.force_vectors_path,
+                sts.toi,
+            )
+
+
 def page_BCs():
     st.title("Boundary Conditions")
+    exists = path_checker()
 
     select_BC_toggle = st.toggle("OpenSim derived BC selection", value=True)
 
     if select_BC_toggle:
         if sts.boi is not None:
-            if sts.moco_solution_dynamics_path is not None and os.path.exists(
-                sts.moco_solution_dynamics_path
-            ):
+            if exists(sts.moco_solution_dynamics_path):
                 st.subheader(f"Select time of interest - {sts.boi}")
-                muscles = [muscle for muscle in sts.bones_muscle_map[sts.boi]]
+                muscles = list(sts.bones_muscle_map[sts.boi])
 
-                toi_selector(
-                    sts.moco_solution_dynamics_path,
-                    muscles,
-                )
-                st.write(f"Selected time: {st.session_state.toi}")
+                toi_fragment(muscles)
             else:
                 st.write("No dynamics detected. Please run :rainbow[Track Kinematics]")
         else:
             st.write(f"Please select a bone of interest under :rainbow[Muscle forces]")
 
-        if sts.toi:
-            with st.empty():
-                visual_toi_boi_force_vectors(
-                    sts.boi_path,
-                    sts.moco_solution_dynamics_path,
-                    sts.force_origins_path,
-                    sts.force_vectors_path,
-                    sts.toi,
-                )
-
     else:
         st.subheader("Manual BC selection")
 
         if sts.boi is not None:
-            if (
-                sts.vol_path is not None
-                and os.path.exists(sts.vol_path)
-                and sts.boi in sts.vol_path
-            ):
+            if exists(sts.vol_path) and sts.boi in sts.vol_path:
                 surf_select = st.toggle(
                     "Apply BCs to surface only",
                     value=True,
@@ -341,8 +316,9 @@ def page_BCs():
 
 def page_FE():
     st.title("Finite Element")
+    exists = path_checker()
 
-    if sts.dirichlet_path and os.path.isfile(sts.dirichlet_path):
+    if exists(sts.dirichlet_path):
         if st.button("Show BCs"):
             visualize_BCs(
                 sts.vol_path,
@@ -351,7 +327,7 @@ def page_FE():
             )
         st.divider()
 
-        if sts.neumann_path is not None and os.path.isfile(sts.neumann_path):
+        if exists(sts.neumann_path):
             if st.button("Run OpenCMISS"):
                 run_open_cmiss(
                     sts.vol_path,
@@ -397,18 +373,23 @@ def page_output():
     st.title("Output")
     st.write(f"Output directory: {sts.output_path}")
 
-    output_files = [
-        f
-        for f in sorted(os.listdir(sts.output_path), key=lambda x: (x.lower(), len(x)))
-        if os.path.isfile(os.path.join(sts.output_path, f))
-    ]
+    with os.scandir(sts.output_path) as it:
+        entries = sorted(it, key=lambda e: (e.name.lower(), len(e.name)))
+    output_files = [entry for entry in entries if entry.is_file()]
+    output_dirs = [entry for entry in entries if entry.is_dir()]
 
     if output_files:
+        prepare_downloads = st.toggle(
+            "Prepare downloads",
+            value=False,
+            help="Reads and zips the output from disk to enable the download buttons.",
+        )
         download = "model" if sts.osim_path is not None else "dir"
         dir_downloader(
             sts.output_path,
             "Output",
             download_name=download,
+            prepare=prepare_downloads,
         )
 
         if st.button(":red[Clear all output]"):
@@ -420,31 +401,33 @@ def page_output():
             clear_output("files")
 
         st.subheader("Download files")
-
-        for file_name in output_files:
-            st.write(file_name)
-            # with open(os.path.join(sts.output_path, file_name), "rb") as file:
-            #     file_data = file.read()
-            #     st.download_button(
-            #         label=f"{file_name}",
-            #         data=file_data,
-            #         file_name=file_name,
-            #     )
+        for entry in output_files:
+            if not prepare_downloads:
+                st.write(entry.name)
+                continue
+            stat = entry.stat()
+            st.download_button(
+                label=f"{entry.name}",
+                data=read_file_bytes(entry.path, stat.st_mtime_ns, stat.st_size),
+                file_name=entry.name,
+            )
 
         st.subheader("Remove files", divider="red")
-        for file_name in output_files:
-            if st.button(f":red[{file_name}]"):
-                clear_output("file", file_name)
+        for entry in output_files:
+            if st.button(f":red[{entry.name}]"):
+                clear_output("file", entry.name)
 
         st.subheader("Folders")
         if st.button(":red[Clear folders]"):
             clear_output("dirs")
 
-        [
-            dir_downloader(os.path.join(sts.output_path, dir), dir, show_files=True)
-            for dir in os.listdir(sts.output_path)
-            if os.path.isdir(os.path.join(sts.output_path, dir))
-        ]
+        for entry in output_dirs:
+            dir_downloader(
+                entry.path,
+                entry.name,
+                show_files=True,
+                prepare=prepare_downloads,
+            )
 
     else:
         st.write("Output folder is empty")
@@ -1,5 +1,16 @@
 import os
-from src.app.app_pages import *
+import streamlit as st
+from src.app.app_pages import (
+    page_home,
+    page_kinematics,
+    page_dynamics,
+    page_boi,
+    page_meshing,
+    page_BCs,
+    page_FE,
+    page_viewFE,
+    page_output,
+)
 
 
 def setup_app():
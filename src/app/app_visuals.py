@@ -2,43 +2,122 @@
 
 # Imports ---------------------------------------------------------------------
 import os
-import time
-import pandas as pd
-import pyvista as pv
+import re
+import numpy as np
 import streamlit as st
-import multiprocessing
 import plotly.colors as pc
 import plotly.express as px
-from stpyvista import stpyvista
-import plotly.graph_objects as go
 from streamlit_plotly_events import plotly_events
 
 from pathlib import Path
-from src.MSM.sto_generator import read_input
-from src.MSM.generate_force_vector_gif import generate_vector_gif
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.app.app_io import read_sto, read_table
+
+sts = st.session_state
+
+# Maximum number of samples plotted per trace
+MAX_PLOT_POINTS = 2000
+
+# Viridis hex colors, fixed for the lifetime of the app
+VIRIDIS = [hex[1] for hex in pc.get_colorscale("Viridis")]
+
+# Channels of a plotly "rgb(r, g, b)" color string
+RGB_RE = re.compile(r"\d+")
+
+# Figure layouts, built once instead of on every plot render
+FIG_LAYOUT = dict(
+    height=700,
+    # width=1000,
+    xaxis_title="Time (s)",
+    yaxis_title="Value",
+    legend_title="Variables",
+    hovermode="x unified",
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1,
+        xanchor="left",
+        x=0,
+        itemsizing="constant",
+        traceorder="grouped",
+    ),
+)
+TOI_LAYOUT = {
+    "title": "Click to select a timestep of interest",
+    "title_font_color": "white",
+    "paper_bgcolor": "rgba(0, 0, 0, 0)",
+    "plot_bgcolor": "rgba(0, 0, 0, 0)",
+    "legend_font_color": "white",
+    "legend_title": "Muscle",
+    "legend_title_font_color": "white",
+}
+TOI_XAXES = {
+    "color": "white",
+    "showgrid": False,
+    "ticks": "outside",
+    "title": "timestep",
+}
+TOI_YAXES = {
+    "color": "white",
+    "gridcolor": "grey",
+    "ticks": "outside",
+    "title": "Force",
+}
 
 
 # Defs ------------------------------------------------------------------------
-def update_fig_layout(fig):
-    fig.update_layout(
-        height=700,
-        # width=1000,
-        xaxis_title="Time (s)",
-        yaxis_title="Value",
-        legend_title="Variables",
-        hovermode="x unified",
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1,
-            xanchor="left",
-            x=0,
-            itemsizing="constant",
-            traceorder="grouped",
-        ),
+def downsample(series, max_points=MAX_PLOT_POINTS):
+    """
+    Largest-Triangle-Three-Buckets downsample of `series` against its index
+
+    Keeps the first and last sample and, for each of the `max_points` - 2
+    buckets in between, the sample spanning the largest triangle with the
+    previously kept sample and the mean of the next bucket, so peaks survive.
+    """
+    n = len(series)
+    if n <= max_points or max_points < 3:
+        return series
+
+    x = np.asarray(series.index, dtype=float)
+    y = np.asarray(series, dtype=float)
+    edges = np.append(np.linspace(1, n - 1, max_points - 1).astype(int), n)
+
+    kept = np.empty(max_points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    for i in range(max_points - 2):
+        start, end, next_end = edges[i], edges[i + 1], edges[i + 2]
+        ax, ay = x[kept[i]], y[kept[i]]
+        cx, cy = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs(
+            (ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay)
+        )
+        kept[i + 1] = start + np.argmax(area)
+
+    return series.iloc[kept]
+
+
+@lru_cache(maxsize=64)
+def sample_viridis(n):
+    """Return `n` evenly spaced viridis colors."""
+    return tuple(
+        px.colors.sample_colorscale("viridis", [i / max(n - 1, 1) for i in range(n)])
     )
 
 
+def muscle_color_map(df):
+    """Map each muscle, the column name before "|", to a viridis color."""
+    # Columns are split and deduplicated in order, for a consistent color index
+    columns = df.columns[df.columns != "time"]
+    muscles = columns.str.split("|", n=1).str[0].unique()
+    return dict(zip(muscles, sample_viridis(len(muscles))))
+
+
+def update_fig_layout(fig):
+    fig.update_layout(FIG_LAYOUT)
+
+
 def visual_kinematics(sto1, sto2, group_legend):
     """
     Plot kinematics to compare Moco track performance between input and output
@@ -47,58 +126,84 @@ def visual_kinematics(sto1, sto2, group_legend):
     :param sto2 [TODO:type]: [TODO:description]
     :param group_legend bool: [TODO:description]
     """
-    df1, _ = read_input(sto1)
-    df2, _ = read_input(sto2)
+    fig = kinematics_figure(
+        sto1,
+        os.stat(sto1).st_mtime_ns,
+        sto2,
+        os.stat(sto2).st_mtime_ns,
+        group_legend,
+    )
+
+    st.plotly_chart(
+        fig,
+        use_container_width=True,
+    )
+
 
-    fig = go.Figure()
+@st.cache_resource(show_spinner=False)
+def kinematics_figure(sto1, mtime1, sto2, mtime2, group_legend):
+    # mtimes only key the cache, so regenerated kinematics rebuild the figure.
+    # Cached figures are shared by all sessions, so they are never mutated after
+    # caching and the legend grouping is part of the key.
+    import pandas as pd
 
-    color_scale = [hex[1] for hex in pc.get_colorscale("Viridis")]
+    df1, _ = read_sto(sto1)
+    df2, _ = read_sto(sto2)
 
+    # Long format, one row per sample, so plotly express builds all traces at once
+    frames = []
     for i, (df, dataset) in enumerate(zip([df1, df2], ["Input", "Output"])):
-        for column in df.columns:
-            if column != "time" and "jointset" in column:
-                legend = column if group_legend else f"{dataset}: {column}"
-                fig.add_trace(
-                    go.Scatter(
-                        x=df.index,
-                        y=df[column],
-                        mode="lines",
-                        line=dict(color=color_scale[2 + i*4]),
-                        name=f"{dataset}: {column.split('/')[-2]}: {column.split('/')[-1]}",
-                        legendgroup=legend,
-                        hovertext=f"{column.split('/')[-2]}: {column.split('/')[-1]}",
-                    )
-                )
+        columns = [col for col in df.columns if col != "time" and "jointset" in col]
+        frame = pd.concat(
+            {column: downsample(df[column]) for column in columns},
+            names=["column", "index"],
+        ).reset_index(name="value")
+        frame["dataset"] = dataset
+        frame["color"] = VIRIDIS[2 + i * 4]
+        frames.append(frame)
+    df_long = pd.concat(frames, ignore_index=True)
+    df_long["trace"] = df_long["dataset"] + ": " + df_long["column"]
+
+    traces = df_long.drop_duplicates("trace").set_index("trace")
+    coordinates = traces["column"].str.split("/")
+    hovertext = coordinates.str[-2] + ": " + coordinates.str[-1]
+
+    fig = px.line(
+        df_long,
+        x="index",
+        y="value",
+        color="trace",
+        render_mode="webgl",
+        color_discrete_map=traces["color"].to_dict(),
+    )
+    fig.update_traces(hovertemplate=None)
+    fig.for_each_trace(
+        lambda trace: trace.update(
+            name=f"{traces['dataset'][trace.name]}: {hovertext[trace.name]}",
+            hovertext=hovertext[trace.name],
+            legendgroup=traces["column"][trace.name] if group_legend else trace.name,
+        )
+    )
 
     update_fig_layout(fig)
 
-    st.plotly_chart(
-        fig,
-        use_container_width=True,
-    )
+    return fig
 
 
 def visual_dynamics(dynamics_path, group_legend=False, color_map=None):
+    import pandas as pd
 
     if os.path.splitext(dynamics_path)[1] == ".sto":
-        df, _ = read_input(dynamics_path)
+        df, _ = read_sto(dynamics_path)
     elif os.path.splitext(dynamics_path)[1] == ".json":
-        df = pd.read_json(dynamics_path, orient="records", lines=True)
+        df = read_table(dynamics_path)
     else:
         print("Input file for dynamics visualisation not recognized, use .sto or .json")
         return
 
     r=False
     if not color_map:
-        # Required for a consistent color index
-        columns = set()
-        for column in df.columns:
-            if column != "time":
-                columns.add(column.split("|")[0])
-        colors = px.colors.sample_colorscale(
-            "viridis", [n / (len(columns) - 1) for n in range(len(columns))]
-        )
-        color_map = {col: colors[i] for i, col in enumerate(columns)}
+        color_map = muscle_color_map(df)
         r=True
     else:
         new_color_map = {}
@@ -110,22 +215,30 @@ def visual_dynamics(dynamics_path, group_legend=False, color_map=None):
         color_map = new_color_map
 
 
-    fig = go.Figure()
-    for column in df.columns:
-        if column != "time":
-            state_name = column.split("|")[1] if group_legend else column
-            name=column.split('/')[-1]
-            muscle = column.split("|")[0]
-            fig.add_trace(
-                go.Scatter(
-                    x=df.index,
-                    y=df[column],
-                    mode="lines",
-                    line=dict(color=color_map[muscle]),
-                    name=f"{column.split('/')[-1]}",
-                    legendgroup=state_name,
-                )
-            )
+    # Long format, one row per sample, so plotly express builds all traces at once
+    columns = [column for column in df.columns if column != "time"]
+    df_long = pd.concat(
+        {column: downsample(df[column]) for column in columns},
+        names=["column", "index"],
+    ).reset_index(name="value")
+
+    fig = px.line(
+        df_long,
+        x="index",
+        y="value",
+        color="column",
+        render_mode="webgl",
+        color_discrete_map={
+            column: color_map[column.split("|")[0]] for column in columns
+        },
+    )
+    fig.update_traces(hovertemplate=None)
+    fig.for_each_trace(
+        lambda trace: trace.update(
+            name=trace.name.split("/")[-1],
+            legendgroup=trace.name.split("|")[1] if group_legend else trace.name,
+        )
+    )
     update_fig_layout(fig)
 
     st.plotly_chart(
@@ -137,6 +250,12 @@ def visual_dynamics(dynamics_path, group_legend=False, color_map=None):
         return color_map
 
 
+@st.cache_resource
+def gif_executor():
+    # Single reused worker process, gif requests from other sessions queue up
+    return ProcessPoolExecutor(max_workers=1)
+
+
 def visual_force_vector_gif(
     mesh_file,
     muscle_force_path,
@@ -144,89 +263,69 @@ def visual_force_vector_gif(
     force_vectors_path,
     output_path,
 ):
-    st.session_state.gif_path = os.path.join(
+    from src.MSM.generate_force_vector_gif import generate_vector_gif
+
+    sts.gif_path = os.path.join(
         output_path, f"{Path(force_vectors_path).stem}.gif"
     )
 
-    process = multiprocessing.Process(
-        target=generate_vector_gif,
-        args=(
-            mesh_file,
-            muscle_force_path,
-            force_origins_path,
-            force_vectors_path,
-            st.session_state.gif_path,
-        ),
-    )
-    process.start()
     with st.spinner("Generating GIF..."):
-        while process.is_alive():
-            time.sleep(0.1)
-    process.join()
+        try:
+            gif_executor().submit(
+                generate_vector_gif,
+                mesh_file,
+                muscle_force_path,
+                force_origins_path,
+                force_vectors_path,
+                sts.gif_path,
+            ).result()
+        except BrokenProcessPool as e:
+            gif_executor.clear()
+            st.error(f"An error occurred: {e}")
+        except Exception as e:
+            st.error(f"An error occurred: {e}")
 
 
 def visual_toi_selector(
     df,
     group_legend=False,
 ):
-    columns = set()
-    for column in df.columns:
-        if column != "time":
-            columns.add(column.split("|")[0])
-    colors = px.colors.sample_colorscale(
-        "viridis", [n / (len(columns) - 1) for n in range(len(columns))]
+    color_map = muscle_color_map(df)
+    sts.color_map = color_map
+
+    df_long = df.drop(columns="time").reset_index().melt(
+        id_vars="index", var_name="column"
     )
-    st.session_state.color_map = {col: colors[i] for i, col in enumerate(columns)}
 
-    fig = go.Figure()
+    fig = px.line(
+        df_long,
+        x="index",
+        y="value",
+        color="column",
+        render_mode="webgl",
+        color_discrete_map={
+            column: color_map[column.split("|")[0]]
+            for column in df.columns
+            if column != "time"
+        },
+    )
+    fig.update_traces(hovertemplate=None)
+    fig.for_each_trace(
+        lambda trace: trace.update(
+            name=trace.name.split("|")[0].split("/")[2],
+            legendgroup=trace.name.split("|")[1] if group_legend else trace.name,
+        )
+    )
     fig.add_vline(
-        x=st.session_state.toi,
+        x=sts.toi,
         line_width=3,
         line_dash="dash",
         line_color="white",
     )
-    for column in df.columns:
-        if column != "time":
-            state_name = column.split("|")[1] if group_legend else column
-            muscle = column.split("|")[0]
-            fig.add_trace(
-                go.Scatter(
-                    x=df.index,
-                    y=df[column],
-                    mode="lines",
-                    line=dict(color=st.session_state.color_map[muscle]),
-                    name=muscle.split("/")[2],
-                    legendgroup=state_name,
-                )
-            )
     # update_fig_layout(fig)
-    fig.update_layout(
-        {
-            "title": "Click to select a timestep of interest",
-            "title_font_color": "white",
-            "paper_bgcolor": "rgba(0, 0, 0, 0)",
-            "plot_bgcolor": "rgba(0, 0, 0, 0)",
-            "legend_font_color": "white",
-            "legend_title": "Muscle",
-            "legend_title_font_color": "white",
-        }
-    )
-    fig.update_xaxes(
-        {
-            "color": "white",
-            "showgrid": False,
-            "ticks": "outside",
-            "title": "timestep",
-        }
-    )
-    fig.update_yaxes(
-        {
-            "color": "white",
-            "gridcolor": "grey",
-            "ticks": "outside",
-            "title": "Force",
-        }
-    )
+    fig.update_layout(TOI_LAYOUT)
+    fig.update_xaxes(TOI_XAXES)
+    fig.update_yaxes(TOI_YAXES)
 
     return fig
 
@@ -237,8 +336,22 @@ def click_visual_toi_selector(df):
         fig, click_event=True, hover_event=False, select_event=False
     )
     if selected_points:
-        st.session_state.toi = selected_points[0]["x"]
-        st.rerun()
+        sts.toi = selected_points[0]["x"]
+        # Called from within the toi fragment, only that part of the page reruns
+        st.rerun(scope="fragment")
+
+
+@st.cache_resource(show_spinner=False)
+def load_mesh(mesh_path, mtime_ns):
+    # mtime only keys the cache, so regenerated meshes are read again
+    import pyvista as pv
+
+    mesh = pv.read(mesh_path)
+    # Only the outer skin of volumetric meshes is visible, drop interior cells
+    if isinstance(mesh, pv.UnstructuredGrid):
+        mesh = mesh.extract_surface()
+
+    return mesh
 
 
 def visual_toi_boi_force_vectors(
@@ -248,11 +361,14 @@ def visual_toi_boi_force_vectors(
     force_vectors_path,
     step,
 ):
-    mesh = pv.read(os.path.join(mesh_path))
-    df, _ = read_input(muscle_force_path)
+    import pyvista as pv
+    from stpyvista import stpyvista
+
+    mesh = load_mesh(mesh_path, os.stat(mesh_path).st_mtime_ns)
+    df, _ = read_sto(muscle_force_path)
 
-    force_origins = pd.read_json(force_origins_path, orient="records", lines=True)
-    force_vectors = pd.read_json(force_vectors_path, orient="records", lines=True)
+    force_origins = read_table(force_origins_path)
+    force_vectors = read_table(force_vectors_path)
 
     pl = pv.Plotter(off_screen=False)
     pl.view_xy()
@@ -265,27 +381,40 @@ def visual_toi_boi_force_vectors(
 
     muscle_names = [name for name in force_vectors.keys() if name != "time"]
 
-    force_vector_actor = {}
-
     scale_factor = 0.01
+    # color_map is keyed by /forceset/<muscle>, parse each color once
+    muscle_rgb = {
+        key.split("/")[-1]: [int(channel) for channel in RGB_RE.findall(value)]
+        for key, value in sts.color_map.items()
+    }
+    default_rgb = [128, 128, 128]
+    origins, colors = [], []
+    arrows = pv.MultiBlock()
     for muscle in muscle_names:
-        for map in st.session_state.color_map:
-            if muscle in map:
-                rgb_color = st.session_state.color_map[map]
-        color = [int(color) for color in re.findall(r"\d+", rgb_color)]
+        # Muscles without a color_map entry fall back to a neutral grey
+        color = muscle_rgb.get(muscle, default_rgb)
+        origins.append(force_origins[muscle][step])
+        colors.append(color)
+        arrow = pv.Arrow(
+            start=force_origins[muscle][step],
+            direction=force_vectors[muscle][step],
+            scale=df[f"/forceset/{muscle}|active_fiber_force"][step] * scale_factor,
+        )
+        arrow.point_data["colors"] = np.tile(color, (arrow.n_points, 1)).astype(
+            np.uint8
+        )
+        arrows.append(arrow)
 
+    # One actor for all origins and one for all arrows, colored per point
+    if origins:
+        points = pv.PolyData(np.array(origins, dtype=float))
+        points.point_data["colors"] = np.array(colors, dtype=np.uint8)
         pl.add_mesh(
-            pv.PolyData(force_origins[muscle][step]),
-            color=color,
+            points,
+            scalars="colors",
+            rgb=True,
             point_size=10,
             render_points_as_spheres=True,
         )
-        force_vector_actor[muscle] = pl.add_mesh(
-            pv.Arrow(
-                start=force_origins[muscle][step],
-                direction=force_vectors[muscle][step],
-                scale=df[f"/forceset/{muscle}|active_fiber_force"][step] * scale_factor,
-            ),
-            color=color,
-        )
+        pl.add_composite(arrows, scalars="colors", rgb=True)
     stpyvista(pl, key="toiboi")
@@ -82,14 +82,13 @@ def scale_factor(points, target_min=10, target_max=200):
     :param target_max: Maximum value of the rescaled range (default: 1000).
     :return: The scale factor and the shifted point cloud.
     """
-    min_val = np.min(points)
-    max_val = np.max(points)
+    value_range = float(np.ptp(points))
 
-    if min_val == max_val:
+    if value_range == 0:
         raise ValueError("All points have the same value; mesn not valid.")
 
     # Compute a uniform scale factor
-    scale_factor = (target_max - target_min) / (max_val - min_val)
+    scale_factor = (target_max - target_min) / value_range
     print(f" - Scaling mesh - factor: {scale_factor}")
 
     return scale_factor
@@ -116,22 +115,18 @@ def align_surface_mesh(
 
     print("-- Loading complete, aligning mesh...")
     inertia_tensor = mesh.moment_inertia
-    eigenvalues, eigenvectors = np.linalg.eig(inertia_tensor)
+    # Inertia tensors are symmetric, eigh returns real orthonormal eigenvectors
+    eigenvalues, eigenvectors = np.linalg.eigh(inertia_tensor)
+    if np.linalg.det(eigenvectors) < 0:
+        # Flip one axis so the alignment is a rotation, not a reflection
+        eigenvectors[:, -1] *= -1
     center_of_mass = mesh.center_mass
     rotation_matrix = eigenvectors.T
 
-    transformation_matrix = np.eye(4)
-    transformation_matrix[:3, :3] = rotation_matrix
-
-    translation_to_origin = np.eye(4)
-    translation_to_origin[:3, 3] = -center_of_mass
-
-    translation_back = np.eye(4)
-    translation_back[:3, 3] = center_of_mass
-
-    full_transformation = (
-        translation_back @ transformation_matrix @ translation_to_origin
-    )
+    # Rotation about the center of mass, closed form of T(c) @ R @ T(-c)
+    full_transformation = np.eye(4)
+    full_transformation[:3, :3] = rotation_matrix
+    full_transformation[:3, 3] = center_of_mass - rotation_matrix @ center_of_mass
 
     mesh.apply_transform(full_transformation)
 
@@ -14,13 +14,11 @@ import os
 import sys
 import argparse
 import numpy as np
-import pandas as pd
-import pyvista as pv
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parents[2]))
 from src.uFE.utils.formatting import timer, print_section
-from src.uFE.bc_visualizer import visualize_BCs
+from src.uFE.utils.default_parameters import DEFAULT_CONFIRM_MIN_CELLS
 
 
 # Defs ------------------------------------------------------------------------
@@ -59,6 +57,26 @@ def parse_arguments():
         action="store_true",
         help="Enable to select surface nodes only",
     )
+    parser.add_argument(
+        "-t",
+        "--txt",
+        action="store_true",
+        help="Also write the selected node ids as human readable .txt files",
+    )
+    parser.add_argument(
+        "-dc",
+        "--dirichlet_cells",
+        type=str,
+        help="Path to .npy of dirichlet cell ids, skips the interactive picker",
+        default=None,
+    )
+    parser.add_argument(
+        "-nc",
+        "--neumann_cells",
+        type=str,
+        help="Path to .npy of neumann cell ids, skips the interactive picker",
+        default=None,
+    )
 
     return parser.parse_args()
 
@@ -71,78 +89,94 @@ def handle_args_surf_select(mesh, surf_select):
     :param surf_select [TODO:type]: [TODO:description]
     """
     if surf_select:
-        select_cells = np.array([]).astype(int)
-        for i, c in enumerate(mesh.cell_data["medit:ref"]):
-            if c == 10:
-                select_cells = np.append(select_cells, i)
-        if select_cells.any():
+        select_cells = np.flatnonzero(np.asarray(mesh.cell_data["medit:ref"]) == 10)
+        if select_cells.size:
             mesh = mesh.extract_cells(select_cells)
         else:
             print("- No distinct surface domain found - assigning BCs volumetricly")
-            mesh.extract_cells(mesh.cells)
-    else:
-        mesh.extract_cells(mesh.cells)
 
     return mesh
 
 
-def pick_bcs(mesh, msg: str = ""):
-    bc_select_pl = pv.Plotter()
-    bc_select_pl.add_mesh(mesh, show_edges=True, color="white")
-    bc_select_pl.enable_cell_picking(mesh, show_message=False)
-    bc_select_pl.add_text(
-        "\n" + msg,
+def bc_plotter(mesh, title, instructions):
+    """
+    Plotter showing `mesh` in the shared BC selection view
+
+    :param mesh pv.DataSet: mesh to show with edges
+    :param title str: text at the top of the window
+    :param instructions str: key bindings shown at the bottom of the window
+    """
+    import pyvista as pv
+
+    pl = pv.Plotter()
+    pl.add_mesh(mesh, show_edges=True, color="white")
+    pl.add_text(
+        "\n" + title,
         color="black",
         position="upper_edge",
     )
-    bc_select_pl.add_text(
-        "Use 'r' to select cells \n Press 'q' or 'e' to continue",
+    pl.add_text(
+        instructions,
         color="black",
         position="lower_edge",
     )
-    bc_select_pl.set_background("white")
-    bc_select_pl.view_xz()
-    bc_select_pl.camera.up = (0, 0, -1)
+    pl.set_background("white")
+    pl.view_xz()
+    pl.camera.up = (0, 0, -1)
+
+    return pl
+
+
+def pick_bcs(mesh, msg: str = "", picked_cells=None):
+    if picked_cells is not None:
+        # Batch mode, select the supplied cell ids without opening any plotter
+        return mesh.extract_cells(picked_cells) if len(picked_cells) else None
+
+    bc_select_pl = bc_plotter(
+        mesh,
+        msg,
+        "Use 'r' to select cells \n Press 'q' or 'e' to continue",
+    )
+    bc_select_pl.enable_cell_picking(mesh, show_message=False)
     bc_select_pl.show()
 
-    if bc_select_pl.picked_cells:
-        bc_pl = pv.Plotter()
-        bc_pl.add_mesh(bc_select_pl.picked_cells, color="white", show_edges=True)
-        bc_pl.set_background("white")
-        bc_pl.add_text(
-            "\n Selected elements",
-            color="black",
-            position="upper_edge",
-        )
-        bc_pl.add_text(
-            "Press 'q' to continue",
-            color="black",
-            position="lower_edge",
-        )
-        bc_pl.view_xz()
-        bc_pl.camera.up = (0, 0, -1)
-        bc_pl.show()
+    picked_cells = bc_select_pl.picked_cells
+    if picked_cells:
+        # Small selections are reported instead of opening a confirmation window
+        if picked_cells.n_cells < DEFAULT_CONFIRM_MIN_CELLS:
+            print(f" - Selected {picked_cells.n_cells} elements")
+        else:
+            bc_pl = bc_plotter(
+                picked_cells,
+                " Selected elements",
+                "Press 'q' to continue",
+            )
+            bc_pl.show()
 
-        return bc_select_pl.picked_cells
+        return picked_cells
     return None
 
 
 def set_bcs(
-    mesh_path,
+    mesh,
     output_path,
     surf_select,
+    dirichlet_cells=None,
+    neumann_cells=None,
+    txt=False,
 ):
-    mesh = pv.read(mesh_path)
-
     mesh = handle_args_surf_select(mesh, surf_select)
 
-    dirichlet_selection = pick_bcs(mesh, "Select constrained boundary elements")
-    neumann_selection = pick_bcs(mesh, "Select loaded boundary elements")
+    dirichlet_selection = pick_bcs(
+        mesh, "Select constrained boundary elements", dirichlet_cells
+    )
+    neumann_selection = pick_bcs(mesh, "Select loaded boundary elements", neumann_cells)
 
     dirichlet_path, neumann_path = write_output(
         output_path,
         dirichlet_selection,
         neumann_selection,
+        txt,
     )
 
     return dirichlet_path, neumann_path
@@ -152,33 +186,42 @@ def write_output(
     output_base,
     dirichlet_selection,
     neumann_selection=None,
+    txt=False,
 ):
     dirichlet_path, neumann_path = None, None
+    dirichlet_json = Path(output_base + "_manual_dirichlet_BC.json")
+    neumann_json = Path(output_base + "_manual_neumann_BC.json")
 
-
-
+    # JSON lines records, one per selected node, as read by pd.read_json(lines=True)
+    # Node ids are sorted and unique, so consumers walk the mesh points in order
     if dirichlet_selection:
-        dirichlet_path = output_base + "_manual_dirichlet_BC.json"
-        df = pd.DataFrame(
-            0,
-            index=range(len(dirichlet_selection.points)),
-            columns=["dirichlet_nodes", "dirichlet_value"],
+        dirichlet_path = str(dirichlet_json)
+        dirichlet_nodes = np.unique(
+            dirichlet_selection.point_data["vtkOriginalPointIds"]
         )
-        df["dirichlet_nodes"] = dirichlet_selection.point_data["vtkOriginalPointIds"]
 
         if neumann_selection:
-            neumann_path = output_base + "_manual_neumann_BC.json"
-            df2 = pd.DataFrame(
-                0,
-                index=range(len(neumann_selection.points)),
-                columns=["neumann_nodes", "neumann_x", "neumann_y", "neumann_z"],
+            neumann_path = str(neumann_json)
+            neumann_nodes = np.unique(
+                neumann_selection.point_data["vtkOriginalPointIds"]
             )
-            df2["neumann_nodes"] = neumann_selection.point_data["vtkOriginalPointIds"]
-            df2["neumann_y"] = -1
-
-            pd.DataFrame(df2).to_json(neumann_path, orient="records", lines=True)
 
-        pd.DataFrame(df).to_json(dirichlet_path, orient="records", lines=True)
+            with open(neumann_path, "w") as f:
+                f.writelines(
+                    f'{{"neumann_nodes":{node},"neumann_x":0,'
+                    f'"neumann_y":-1,"neumann_z":0}}\n'
+                    for node in neumann_nodes.tolist()
+                )
+            if txt:
+                np.savetxt(neumann_json.with_suffix(".txt"), neumann_nodes, fmt="%d")
+
+        with open(dirichlet_path, "w") as f:
+            f.writelines(
+                f'{{"dirichlet_nodes":{node},"dirichlet_value":0}}\n'
+                for node in dirichlet_nodes.tolist()
+            )
+        if txt:
+            np.savetxt(dirichlet_json.with_suffix(".txt"), dirichlet_nodes, fmt="%d")
 
         print(f"-- Writing files:")
         print(f" - {dirichlet_path}\n - {neumann_path}") if neumann_path else print(
@@ -193,6 +236,9 @@ def assign_bcs_manually(
     mesh_path,
     output_base,
     surf_select=False,
+    dirichlet_cells=None,
+    neumann_cells=None,
+    txt=False,
 ):
     """
     Select the location of both Dirichlet and Neumann boundary conditions manually
@@ -200,6 +246,9 @@ def assign_bcs_manually(
     :param `mesh_path`: /Path/to/input/mesh.mesh
     :(optional) param `surf_select`: bool, allows for selection of surface nodes only when True.
     :: Only when supported by mesh type, i.e. mmg level-set generated .mesh. `Default=False`.
+    :(optional) param `dirichlet_cells`, `neumann_cells`: /Path/to/cell_ids.npy
+    :: When both are given BCs are assigned in batch, without opening any plotter.
+    :(optional) param `txt`: bool, also writes the node ids as .txt for debugging.
     @returns: void
     @outputs:
     :file `input_file_dirichlet_BC.npy` list of selected nodes where displacement is constrained
@@ -212,13 +261,31 @@ def assign_bcs_manually(
     )
     print(output_base)
 
+    # pyvista loads VTK, imported here so the CLI --help returns without it
+    import pyvista as pv
+
+    # Read once, picking and the BC overview share the mesh
+    mesh = pv.read(mesh_path)
+
+    batch = dirichlet_cells is not None and neumann_cells is not None
+    if dirichlet_cells is not None:
+        dirichlet_cells = np.load(dirichlet_cells)
+    if neumann_cells is not None:
+        neumann_cells = np.load(neumann_cells)
+
     dirichlet_path, neumann_path = set_bcs(
-        mesh_path,
+        mesh,
         output_base,
         surf_select,
+        dirichlet_cells,
+        neumann_cells,
+        txt,
     )
 
-    visualize_BCs(mesh_path, dirichlet_path, neumann_path)
+    if not batch:
+        from src.uFE.bc_visualizer import visualize_BCs
+
+        visualize_BCs(mesh_path, dirichlet_path, neumann_path, mesh=mesh)
 
 
 if __name__ == "__main__":
@@ -228,4 +295,7 @@ if __name__ == "__main__":
         args.input,
         args.output,
         args.surface,
+        args.dirichlet_cells,
+        args.neumann_cells,
+        args.txt,
     )
@@ -3,7 +3,7 @@
 """
 # Imports ---------------------------------------------------------------------
 import argparse
-import pandas as pd
+import numpy as np
 import pyvista as pv
 
 
@@ -47,13 +47,34 @@ def parse_arguments():
     return parser.parse_args()
 
 
+def read_bc_nodes(bc_path, column):
+    """
+    Read the node ids of one column of a JSON lines BC file as an intp array,
+    matched in one pass without tokenising every record into a DataFrame
+    """
+    nodes = np.fromregex(bc_path, rf'"{column}":(\d+)', dtype=[(column, np.int64)])
+    # Contiguous platform index dtype, gathers need no conversion
+    return np.ascontiguousarray(nodes[column], dtype=np.intp)
+
+
+def bc_points(mesh, nodes, color):
+    """Mesh points of `nodes` and a matching (n, 3) uint8 rgb array"""
+    points = np.take(mesh.points, nodes, axis=0)
+    colors = np.empty((len(nodes), 3), dtype=np.uint8)
+    colors[:] = color
+    return points, colors
+
+
 # Main ------------------------------------------------------------------------
 def visualize_BCs(
     mesh_path,
     dirichlet_path=None,
     neumann_path=None,
+    mesh=None,
 ):
-    mesh = pv.read(mesh_path)
+    # Callers that already loaded the mesh pass it to skip a second read
+    if mesh is None:
+        mesh = pv.read(mesh_path)
     print("-- Mesh vertex, element count:", mesh.n_points, mesh.n_cells)
 
     pl = pv.Plotter()
@@ -69,16 +90,24 @@ def visualize_BCs(
     )
     pl.add_axes(interactive=True)
 
+    # BC nodes are drawn as one point cloud actor, colored per node
+    bcs = []
     if dirichlet_path:
-        df = pd.read_json(dirichlet_path, orient="records", lines=True)
-        # dirichlet_nodes = np.load(dirichlet_path)
-        print(" - Dirichlet vertex count:", len(df["dirichlet_nodes"]))
-        pl.add_mesh(mesh.points[df["dirichlet_nodes"]], color="blue")
+        dirichlet_nodes = read_bc_nodes(dirichlet_path, "dirichlet_nodes")
+        print(" - Dirichlet vertex count:", len(dirichlet_nodes))
+        bcs.append(bc_points(mesh, dirichlet_nodes, (0, 0, 255)))
     if neumann_path:
-        df2 = pd.read_json(neumann_path, orient="records", lines=True)
-        # neumann_nodes = np.load(neumann_path)
-        print(" - Neumann vertex count:", len(df2["neumann_nodes"]))
-        pl.add_mesh(mesh.points[df2["neumann_nodes"]], color="red")
+        neumann_nodes = read_bc_nodes(neumann_path, "neumann_nodes")
+        print(" - Neumann vertex count:", len(neumann_nodes))
+        bcs.append(bc_points(mesh, neumann_nodes, (255, 0, 0)))
+    if bcs:
+        points, colors = (np.concatenate(arrays) for arrays in zip(*bcs))
+        pl.add_points(
+            points,
+            scalars=colors,
+            rgb=True,
+            render_points_as_spheres=False,
+        )
     pl.show(auto_close=True)
 
 
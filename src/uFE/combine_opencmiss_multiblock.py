@@ -2,11 +2,13 @@
 """
 # Imports ---------------------------------------------------------------------
 import os
-import glob
 import meshio
 import argparse
+import numpy as np
 import pyvista as pv
+from concurrent.futures import ThreadPoolExecutor
 from utils.formatting import return_timer, print_section
+from utils.structure import natural_key
 
 
 # Defs ------------------------------------------------------------------------
@@ -48,6 +50,74 @@ def parse_arguments():
     return parser.parse_args()
 
 
+def find_block_files(solution_path):
+    """
+    Block files of `solution_path`, matched on prefix and a case insensitive .vtk
+    extension in one directory scan, in natural order of their block numbers
+    """
+    directory, prefix = os.path.split(solution_path)
+    with os.scandir(directory or ".") as it:
+        return sorted(
+            (
+                entry.path
+                for entry in it
+                if entry.name.startswith(prefix)
+                and entry.name.lower().endswith(".vtk")
+                and entry.is_file()
+            ),
+            key=natural_key,
+        )
+
+
+def append_blocks(meshes):
+    """
+    Append unstructured grids into one grid without merging points, equivalent to
+    `pv.MultiBlock.combine()`. Output arrays are allocated once from the summed
+    block sizes and filled per block, point and cell data common to all blocks are
+    carried over.
+    """
+    n_points = sum(mesh.n_points for mesh in meshes)
+    n_cells = sum(mesh.n_cells for mesh in meshes)
+    n_cell_ids = sum(mesh.cells.size for mesh in meshes)
+
+    points = np.empty((n_points, 3), dtype=meshes[0].points.dtype)
+    cells = np.empty(n_cell_ids, dtype=meshes[0].cells.dtype)
+    celltypes = np.empty(n_cells, dtype=np.uint8)
+
+    point_offset, cell_offset, cell_id_offset = 0, 0, 0
+    for mesh in meshes:
+        block_cells = mesh.cells
+        # Legacy cell layout [n, id_0, .., id_n-1, ...], shift point ids, not counts
+        is_point_id = np.ones(block_cells.size, dtype=bool)
+        is_point_id[mesh.offset[:-1] + np.arange(mesh.n_cells)] = False
+
+        points[point_offset : point_offset + mesh.n_points] = mesh.points
+        cells[cell_id_offset : cell_id_offset + block_cells.size] = np.where(
+            is_point_id, block_cells + point_offset, block_cells
+        )
+        celltypes[cell_offset : cell_offset + mesh.n_cells] = mesh.celltypes
+
+        point_offset += mesh.n_points
+        cell_offset += mesh.n_cells
+        cell_id_offset += block_cells.size
+
+    combined = pv.UnstructuredGrid(cells, celltypes, points)
+    for data, combined_data in (
+        ("point_data", combined.point_data),
+        ("cell_data", combined.cell_data),
+    ):
+        names = set.intersection(
+            *(set(getattr(mesh, data).keys()) for mesh in meshes)
+        )
+        for name in getattr(meshes[0], data).keys():
+            if name in names:
+                combined_data[name] = np.concatenate(
+                    [getattr(mesh, data)[name] for mesh in meshes]
+                )
+
+    return combined
+
+
 # Defs ------------------------------------------------------------------------
 @return_timer
 def combine_OpenCMISS_blocks(
@@ -58,20 +128,19 @@ def combine_OpenCMISS_blocks(
     print_section()
     print("-- Initiating mesh combination, combining blocks:")
 
-    input_files = sorted(glob.glob(f"{solution_path}*.vtK"))
+    input_files = find_block_files(solution_path)
 
-    multi_block = pv.MultiBlock()
+    # Block reads are I/O bound, overlap them and keep the file order
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(input_files)))) as pool:
+        meshes = list(pool.map(pv.read, input_files))
 
-    for i, block_file in enumerate(input_files):
-        mesh = pv.read(block_file)
+    for block_file, mesh in zip(input_files, meshes):
         print(f" - {os.path.basename(block_file)}, cells: {mesh.n_cells}")
-        multi_block.append(mesh)
-        multi_block.set_block_name(i, block_file.split("/")[-1])
 
-    mesh = multi_block.combine()
+    mesh = append_blocks(meshes)
     print(f"-- Mesh combined, total number of cells: {mesh.n_cells}")
 
-    mesh.save(combined_solution_path, binary=False)
+    mesh.save(combined_solution_path, binary=True)
     print(
         f" - Writing files:\n - {combined_solution_path}\n"
         " - time elapse:"
@@ -11,13 +11,11 @@ import os
 import sys
 import argparse
 import numpy as np
-import pandas as pd
 import pyvista as pv
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parents[2]))
 from src.uFE.utils.formatting import timer, print_section
-from src.uFE.bc_visualizer import visualize_BCs
 
 
 # Defs ------------------------------------------------------------------------
@@ -47,7 +45,7 @@ def parse_arguments():
         "-o",
         "--output",
         type=str,
-        help="Output base name for BC files",
+        help="Output path for the .npz design domain file",
         required=True,
     )
 
@@ -58,15 +56,15 @@ def write_design_domain(
     design_path,
     design_selection,
 ):
-    df = pd.DataFrame(
-        0,
-        index=range(len(design_selection.points)),
-        columns=["design_nodes", "design_domain"],
-    )
-    df["design_nodes"] = design_selection.point_data["vtkOriginalPointIds"]
-    df["design_domain"] = -1
-
-    pd.DataFrame(df).to_json(design_path, orient="records", lines=True)
+    # Node ids and their immutable bone (-1) domain value as binary arrays
+    design_nodes = design_selection.point_data["vtkOriginalPointIds"]
+    # Written through a file object, a path would get .npz appended to other suffixes
+    with open(design_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            design_nodes=design_nodes.astype(np.uint32),
+            design_domain=np.full(len(design_nodes), -1, dtype=np.int8),
+        )
 
     print(f"-- Writing files:\n - {design_path}")
 
@@ -84,7 +82,17 @@ def generate_design_domain(
     print(f"-- Generating design domain - loading file:\n - {mesh_path}")
 
     mesh = pv.read(mesh_path)
-    surf = mesh.extract_surface()
+    if isinstance(mesh, pv.PolyData):
+        # Already a surface, every point is a surface node
+        surf = mesh.copy(deep=False)
+        surf.point_data["vtkOriginalPointIds"] = np.arange(mesh.n_points)
+    else:
+        # Only point ids are written, skip the cell id map and nonlinear subdivision
+        surf = mesh.extract_surface(
+            pass_pointid=True,
+            pass_cellid=False,
+            nonlinear_subdivision=0,
+        )
 
     write_design_domain(
         output_path,
@@ -18,6 +18,7 @@ import sys
 from sys import getsizeof
 import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from numpy.typing import NDArray
 import tifffile
@@ -33,6 +34,7 @@ from matplotlib import pyplot as plt
 sys.path.insert(0, str(Path(__file__).parents[1]))
 from utils.formatting import print_status, print_section, timer
 from utils.handle_args import handle_args_suffix
+from utils.structure import natural_key
 from utils.visualisation import visualize_stack
 from uFE.qa_highres_surface import assure_surface_mesh_quality
 
@@ -144,11 +146,22 @@ def load_img(input, start=0, end=-1):
             img = img[start:end]
 
         case "tiff":
-            input_slices = [
-                os.path.join(input, file)
-                for file in os.listdir(input)
-            ]
-            img = tifffile.imread(input_slices[start:end])
+            # Natural order, unpadded slice numbers would sort slice_10 before slice_2
+            input_slices = sorted(
+                (os.path.join(input, file) for file in os.listdir(input)),
+                key=natural_key,
+            )[start:end]
+
+            # Decoding releases the GIL, read slices concurrently into one stack
+            first = tifffile.imread(input_slices[0])
+            img = np.empty((len(input_slices), *first.shape), dtype=first.dtype)
+            img[0] = first
+
+            def read_slice(i):
+                img[i] = tifffile.imread(input_slices[i])
+
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+                list(pool.map(read_slice, range(1, len(input_slices))))
 
     print_status(
         " - Loading complete, image size:",
@@ -170,21 +183,11 @@ def trim_zeros(arr, margin=0, quiet=False, visual=True):
     """
     s = []
     for dim in range(arr.ndim):
-        start = 0
-        end = -1
-        slice_ = [slice(None)] * arr.ndim
-        go = True
-        while go:
-            slice_[dim] = start
-            go = not np.any(arr[tuple(slice_)])
-            start += 1
-        start = max(start - 1 - margin, 0)
-        go = True
-        while go:
-            slice_[dim] = end
-            go = not np.any(arr[tuple(slice_)])
-            end -= 1
-        end = arr.shape[dim] + min(-1, end + 1 + margin) + 1
+        # One reduction over the other axes flags the non-zero slices along dim
+        axes = tuple(i for i in range(arr.ndim) if i != dim)
+        nonzero = np.any(arr, axis=axes)
+        start = max(int(np.argmax(nonzero)) - margin, 0)
+        end = min(arr.shape[dim] - int(np.argmax(nonzero[::-1])) + margin, arr.shape[dim])
         s.append(slice(start, end))
 
     if np.amax(arr[tuple(s)]) == 0:
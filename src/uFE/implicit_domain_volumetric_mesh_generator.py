@@ -274,7 +274,7 @@ def generate_implicit_domain_volumetric_mesh(
 
         print_status(
             "-- Volumetric mesh loaded, mesh bounds: ",
-            f"{[bound for bound in mesh.bounds]}",
+            f"{list(mesh.bounds)}",
         )
 
         if metric == "implicit_distance":
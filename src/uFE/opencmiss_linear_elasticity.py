@@ -80,7 +80,7 @@ def parse_arguments():
         "-dd",
         "--design",
         type=str,
-        help="Path to design element nodes file (.npy) ",
+        help="Path to design element nodes file (.npz) ",
         default=None,
     )
     return parser.parse_args()
@@ -141,8 +141,13 @@ def calculate_linear_elasticity(
         df2 = pd.read_json(neumann_path, orient="records", lines=True)
         neumannNodes = df2["neumann_nodes"] + 1
 
-        df3 = pd.read_json(design_path, orient="records", lines=True)
-        designNodes = df3["design_nodes"] + 1
+        # Design domains are written as .npz, older output as JSON lines
+        if os.path.splitext(design_path)[1] == ".npz":
+            with np.load(design_path) as design:
+                designNodes = design["design_nodes"].astype(np.int64) + 1
+        else:
+            df3 = pd.read_json(design_path, orient="records", lines=True)
+            designNodes = df3["design_nodes"] + 1
 
     except Exception as e:
         print(e)
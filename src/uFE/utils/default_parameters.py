@@ -20,3 +20,6 @@ DEFAULT_HMAX = 1e2
 DEFAULT_SUBDOMAIN = 3
 DEFAULT_MEMORY_MAX = 16000
 DEFAULT_MESH_ITERATIONS = 1
+
+# 7) Boundary conditions
+DEFAULT_CONFIRM_MIN_CELLS = 100
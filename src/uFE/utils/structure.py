@@ -2,9 +2,15 @@
 Modules for standardizing project file and dir structure.
 """
 import os
+import re
 from pathlib import Path
 
 
+def natural_key(name):
+    """Sort key comparing digit runs as numbers, i.e. slice_2 before slice_10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
 def check_project_directory(project_path: Path, verbose=False):
     if project_path.exists() and project_path.is_dir():
         if verbose: